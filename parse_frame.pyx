@@ -0,0 +1,80 @@
+# cython: language_level=3
+"""
+Parser da mensagem do ESP32 compilado em C (via Cython).
+
+Versão compilada da função `parse_frame` usada por `testeESP32.py` quando
+este módulo estiver construído; sem ele, o script cai automaticamente na
+versão Python equivalente (regex compilada). A varredura aqui é feita com
+`strtol`/`strtod` da libc, sem criar nenhum objeto Python intermediário além
+da tupla de retorno — tipicamente uma ordem de grandeza mais rápida que o
+caminho interpretado, liberando folga de CPU para a recepção.
+
+Para construir (requer Cython e um compilador C):
+
+    cythonize -i parse_frame.pyx
+
+O formato esperado é o mesmo aceito pela regex `PARSE_RE` do script:
+
+    Tempo_ms:<int>, Tensao:<float>, Corrente:<float>, Rotacao:<int>,
+
+com espaços opcionais após as vírgulas (como o firmware envia).
+"""
+from libc.stdlib cimport strtol, strtod
+from libc.string cimport strncmp
+
+
+cdef const char* _campo(const char* s, const char* rotulo, int tamanho) noexcept:
+    # Pula vírgula e espaços e confere o rótulo do próximo campo; devolve o
+    # ponteiro logo após o rótulo, ou NULL se o rótulo não casar.
+    while s[0] == c',' or s[0] == c' ':
+        s += 1
+    if strncmp(s, rotulo, tamanho) != 0:
+        return NULL
+    return s + tamanho
+
+
+cpdef parse_frame(bytes data):
+    """
+    Extrai `(tempo_ms, tensao, corrente, rotacao)` da mensagem do ESP32.
+
+    Args:
+        data (bytes): Payload cru do datagrama (terminado em NUL pelo
+            próprio objeto bytes do CPython).
+
+    Retorna:
+        tuple | None: `(int, float, float, int)` com os quatro campos, ou
+        None se a mensagem não estiver no formato esperado.
+    """
+    cdef const char* s = data
+    cdef char* end
+    cdef long tempo_ms, rotacao
+    cdef double tensao, corrente
+
+    if strncmp(s, b"Tempo_ms:", 9) != 0:
+        return None
+    tempo_ms = strtol(s + 9, &end, 10)
+    if end == s + 9:
+        return None
+
+    s = _campo(end, b"Tensao:", 7)
+    if s == NULL:
+        return None
+    tensao = strtod(s, &end)
+    if end == s:
+        return None
+
+    s = _campo(end, b"Corrente:", 9)
+    if s == NULL:
+        return None
+    corrente = strtod(s, &end)
+    if end == s:
+        return None
+
+    s = _campo(end, b"Rotacao:", 8)
+    if s == NULL:
+        return None
+    rotacao = strtol(s, &end, 10)
+    if end == s:
+        return None
+
+    return tempo_ms, tensao, corrente, rotacao
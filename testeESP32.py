@@ -1,276 +1,821 @@
-import socket
-import csv
-import os
-import time
-
-# --- Configurações ---
-UDP_IP = "192.168.137.1"  # O IP do SEU PC (para onde o ESP32 envia dados)
-UDP_PORT_DATA = 4210     # Porta que o Python escuta dados do ESP32
-ESP32_IP = "192.168.137.155" # IP do seu ESP32! (Verifique no Serial Monitor do ESP32)
-ESP32_COMMAND_PORT = 4211 # Porta que o ESP32 está escutando comandos
-
-CSV_FILENAME = "dados_esp32_012.csv"
-ACQUISITION_DURATION_SECONDS = 20 # Duração da aquisição que VOCÊ QUER ENVIAR para o ESP32
-
-def setup_csv_file():
-    """
-    Prepara o arquivo CSV para a gravação dos dados recebidos do ESP32.
-    
-    Esta função é responsável por garantir que o arquivo CSV, cujo nome é definido
-    pela variável global `CSV_FILENAME`, esteja pronto para receber os dados.
-    
-    Comportamento:
-    1.  Verifica se o arquivo `CSV_FILENAME` já existe no diretório atual.
-    2.  Se o arquivo **não existe**:
-        - Ele é criado.
-        - Uma linha de cabeçalho é escrita na primeira linha do arquivo.
-          Os cabeçalhos são: 'Tempo_ms', 'Tensao', 'Corrente', 'Rotacao'.
-        - Uma mensagem informativa é impressa no console, indicando que o
-          arquivo foi criado com o cabeçalho.
-    3.  Se o arquivo **já existe**:
-        - Nenhuma alteração é feita no conteúdo existente do arquivo.
-        - Novas linhas de dados serão simplesmente anexadas ao final do arquivo
-          quando a função `main` começar a receber e salvar dados.
-        - Uma mensagem informativa é impressa no console, indicando que novas
-          linhas serão adicionadas ao arquivo existente.
-    
-    O arquivo é aberto no modo de anexar ('a'), e `newline=''` é usado para
-    prevenir problemas de linhas em branco extras que podem ocorrer em diferentes
-    sistemas operacionais ao trabalhar com arquivos CSV.
-    
-    Não recebe argumentos.
-    Não retorna nenhum valor.
-    """
-    file_exists = os.path.isfile(CSV_FILENAME)
-    with open(CSV_FILENAME, 'a', newline='') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        if not file_exists:
-            csv_writer.writerow(['Tempo_ms', 'Tensao', 'Corrente', 'Rotacao'])
-            print(f"Arquivo '{CSV_FILENAME}' criado com cabeçalho.")
-        else:
-            print(f"Arquivo '{CSV_FILENAME}' já existe. Novas linhas serão adicionadas.")
-
-def send_command_to_esp32(command):
-    """
-    Envia um comando via protocolo UDP (User Datagram Protocol) para o módulo ESP32.
-
-    Esta função estabelece uma comunicação unidirecional para enviar instruções
-    ao ESP32. Ela cria um socket UDP temporário para cada comando enviado.
-
-    Processo:
-    1.  Cria um novo socket UDP (`socket.AF_INET` para IPv4, `socket.SOCK_DGRAM` para UDP).
-    2.  Tenta enviar a string do comando (`command`) para o endereço IP e porta
-        especificados nas variáveis globais `ESP32_IP` e `ESP32_COMMAND_PORT`.
-        A string do comando é codificada para bytes usando UTF-8 antes do envio.
-    3.  Em caso de sucesso, uma mensagem é impressa no console confirmando o envio
-        do comando e o destino.
-    4.  Em caso de falha durante o envio (por exemplo, problemas de rede, ESP32
-        não acessível), uma exceção é capturada e uma mensagem de erro é impressa.
-    5.  Independentemente do sucesso ou falha, o socket de comando é sempre fechado
-        no bloco `finally`, garantindo a liberação dos recursos de rede.
-
-    Args:
-        command (str): A string do comando a ser enviada. Exemplos de comandos
-                       esperados pelo ESP32 podem ser:
-                       - "START_ACQUISITION:20000" (inicia aquisição por 20 segundos)
-                       - "STOP_ACQUISITION" (interrompe a aquisição)
-
-    Não retorna nenhum valor.
-    """
-    sock_command = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) # UDP
-    try:
-        sock_command.sendto(command.encode('utf-8'), (ESP32_IP, ESP32_COMMAND_PORT))
-        print(f"Comando '{command}' enviado para ESP32 em {ESP32_IP}:{ESP32_COMMAND_PORT}")
-    except Exception as e:
-        print(f"Erro ao enviar comando para o ESP32: {e}")
-    finally:
-        sock_command.close()
-
-def main():
-    """
-    Função principal do script, responsável por gerenciar a comunicação UDP
-    com o ESP32 e a gravação dos dados em um arquivo CSV.
-    
-    Esta função coordena todo o fluxo de trabalho do programa:
-    
-    1.  **Validação Inicial do IP do ESP32**:
-        - Verifica se a variável global `ESP32_IP` ainda contém o endereço IP
-          fictício de exemplo. Se sim, imprime um aviso crítico no console,
-          lembrando o usuário de configurar o IP real do seu ESP32.
-          (Uma linha `return` comentada existe para, se descomentada, forçar
-          a interrupção do script até que o IP seja corrigido).
-    
-    2.  **Configuração do Socket de Dados para Recepção**:
-        - Cria um socket UDP (`sock_data`) que será usado para receber os dados
-          enviados pelo ESP32.
-        - Vincula este socket ao endereço IP do PC (`UDP_IP`) e à porta de dados
-          (`UDP_PORT_DATA`), tornando o script "escuta" por pacotes UDP nestes
-          parâmetros.
-        - Define um timeout de 1.0 segundo (`sock_data.settimeout(1.0)`) para as
-          operações de recebimento. Isso evita que o script fique bloqueado
-          indefinidamente esperando por dados, permitindo que o loop continue
-          mesmo se não houver pacotes chegando.
-    
-    3.  **Preparação do Arquivo CSV**:
-        - Chama a função `setup_csv_file()` para garantir que o arquivo CSV
-          esteja devidamente configurado (criado com cabeçalho ou pronto para anexar).
-    
-    4.  **Envio do Comando de Início de Aquisição**:
-        - Converte a `ACQUISITION_DURATION_SECONDS` (em segundos) para milissegundos.
-        - Constrói a string do comando de início no formato
-          "START_ACQUISITION:<duração_em_ms>".
-        - Envia este comando ao ESP32 usando a função `send_command_to_esp32()`.
-          O ESP32 é esperado para iniciar a coleta e transmissão de dados por
-          essa duração.
-    
-    5.  **Loop Principal de Recepção e Processamento de Dados**:
-        - Entra em um loop `while True` que continua indefinidamente até ser
-          interrompido por um timeout de segurança, erro, ou interrupção do usuário.
-        - **Timeout de Segurança do Python**:
-            - A cada iteração, verifica se o tempo decorrido desde o início do
-              script Python excedeu a duração da aquisição esperada do ESP32
-              mais uma margem de 5 segundos. Se exceder, assume que o ESP32
-              parou de enviar dados inesperadamente e encerra o loop.
-        - **Recepção de Dados**:
-            - Tenta receber um pacote UDP do ESP32 usando `sock_data.recvfrom(1024)`.
-            - Decodifica os bytes recebidos para uma string UTF-8 e remove
-              espaços em branco.
-        - **Processamento da Mensagem**:
-            - A mensagem recebida é esperada no formato:
-              "Tempo_ms:VALOR,Tensao:VALOR,Corrente:VALOR,Rotacao:VALOR".
-            - A string é dividida por vírgulas e cada parte é analisada para
-              extrair os valores de `Tempo_ms` (int), `Tensao` (float),
-              `Corrente` (float) e `Rotacao` (int).
-            - Verifica se todos os valores foram extraídos com sucesso.
-        - **Validação Opcional do Timestamp**:
-            - Compara o `timestamp_esp32` recém-recebido com o `last_received_timestamp_esp32`.
-            - Se o timestamp atual for menor ou igual ao anterior (e não for o
-              primeiro pacote), imprime um aviso de "pacote fora de ordem ou duplicado".
-              Isso é útil para depurar a comunicação UDP, que não garante ordem.
-            - Atualiza `last_received_timestamp_esp32` com o timestamp atual.
-        - **Gravação no CSV**:
-            - Se a mensagem foi processada corretamente, os valores extraídos
-              são escritos como uma nova linha no arquivo CSV.
-        - **Tratamento de Erros no Loop**:
-            - `except socket.timeout`: Captura a exceção quando nenhum dado é
-              recebido dentro do timeout de 1 segundo. O `pass` permite que o
-              loop continue sem travar.
-            - `except Exception as e`: Captura quaisquer outros erros que possam
-              ocorrer durante o processamento de uma mensagem (ex: formato
-              inesperado). Imprime o erro e a mensagem bruta.
-    
-    6.  **Gerenciamento de Encerramento (try...except...finally)**:
-        - `except KeyboardInterrupt`: Captura a interrupção do usuário (Ctrl+C),
-          imprimindo uma mensagem de encerramento.
-        - `except Exception as e`: Captura quaisquer erros gerais não tratados
-          anteriormente que possam ocorrer fora do loop principal.
-        - `finally`: Este bloco é **sempre** executado, garantindo uma finalização
-          limpa do script:
-            - Envia um comando "STOP_ACQUISITION" para o ESP32, instruindo-o
-              a parar de transmitir dados.
-            - Fecha o socket de dados (`sock_data.close()`), liberando a porta
-              e os recursos de rede.
-            - Imprime uma mensagem confirmando o fechamento do socket.
-    
-    Não recebe argumentos.
-    Não retorna nenhum valor.
-    """
-    # Validação do IP do ESP32
-    # if ESP32_IP == "192.168.137.155": # Este é o IP fictício do exemplo
-    #     print("\nATENÇÃO: Por favor, substitua 'ESP32_IP' no código pelo IP real do seu ESP32 antes de rodar!")
-    #     # return # Descomente essa linha para forçar você a mudar o IP
-
-    # Socket para receber dados do ESP32
-    sock_data = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock_data.bind((UDP_IP, UDP_PORT_DATA))
-    sock_data.settimeout(1.0) # Timeout para não travar o loop de recebimento
-
-    print(f"Escutando dados UDP em {UDP_IP}:{UDP_PORT_DATA}")
-    setup_csv_file()
-
-    # --- Enviar o comando de INÍCIO de aquisição com a duração ---
-    duration_ms = ACQUISITION_DURATION_SECONDS * 1000 # Converte segundos para milissegundos
-    start_command = f"START_ACQUISITION:{duration_ms}"
-    send_command_to_esp32(start_command)
-
-    # O script Python agora apenas espera os dados, o ESP32 controla a duração
-    print(f"Aguardando dados do ESP32 por até {ACQUISITION_DURATION_SECONDS} segundos (controlado pelo ESP32)...")
-    
-    # Opcional: registrar o tempo de início do lado do Python para um timeout de segurança
-    python_script_start_time = time.time()
-
-    last_received_timestamp_esp32 = -1 # Para verificar a progressão do tempo do ESP32
-
-    try:
-        while True:
-            # Timeout de segurança do lado do Python, caso o ESP32 pare de enviar inesperadamente
-            if (time.time() - python_script_start_time) > (ACQUISITION_DURATION_SECONDS + 5): # +5s de margem
-                print("\nAVISO: Tempo limite de espera do Python excedido. O ESP32 pode ter parado de enviar dados.")
-                break
-
-            try:
-                data, addr = sock_data.recvfrom(1024) # Recebe dados do ESP32
-                message = data.decode('utf-8').strip()
-
-                # Processar a mensagem
-                parts = message.split(',')
-                timestamp_esp32 = None
-                tensao = None
-                corrente = None
-                rotacao = None
-
-                for part in parts:
-                    if "Tempo_ms:" in part:
-                        timestamp_esp32 = int(part.split(':')[1])
-                    elif "Tensao:" in part:
-                        tensao = float(part.split(':')[1])
-                    elif "Corrente:" in part:
-                        corrente = float(part.split(':')[1])
-                    elif "Rotacao:" in part:
-                        rotacao = int(part.split(':')[1])
-                
-                if timestamp_esp32 is not None and tensao is not None and corrente is not None and rotacao is not None:
-                    # Opcional: verificar se o timestamp do ESP32 está progredindo
-                    if timestamp_esp32 <= last_received_timestamp_esp32 and last_received_timestamp_esp32 != -1:
-                        print(f"AVISO: Pacote fora de ordem ou duplicado: Tempo_ms={timestamp_esp32} (anterior={last_received_timestamp_esp32})")
-                    last_received_timestamp_esp32 = timestamp_esp32
-
-                    with open(CSV_FILENAME, 'a', newline='') as csvfile:
-                        csv_writer = csv.writer(csvfile)
-                        csv_writer.writerow([timestamp_esp32, tensao, corrente, rotacao])
-                    # print(f"Salvo: Tempo_ms={timestamp_esp32}, Tensao={tensao:.2f}, Corrente={corrente:.2f}, Rotacao={rotacao}")
-                else:
-                    print(f"Aviso: Mensagem incompleta/malformada: '{message}'")
-
-            except socket.timeout:
-                print("Nenhum dado recebido no último segundo. Aguardando...")
-                pass # Continua o loop para verificar o tempo limite ou se o ESP32 parou
-            except Exception as e:
-                print(f"Erro ao processar dados recebidos: {e}")
-                print(f"Mensagem bruta que causou o erro: '{message}'")
-
-    except KeyboardInterrupt:
-        print("\nPrograma encerrado pelo usuário.")
-    except Exception as e:
-        print(f"Ocorreu um erro geral: {e}")
-    finally:
-        send_command_to_esp32("STOP_ACQUISITION") # Envia o comando STOP ao finalizar o script Python
-        sock_data.close()
-        print("Socket de dados fechado.")
-
-if __name__ == "__main__":
-    main()  
-    # Este é um padrão comum em scripts Python. 
-    # Garante que a função main() seja chamada apenas quando
-    # o script é executado diretamente (e não quando é importado 
-    # como um módulo em outro script)
-
-
-
-
-
-
-
-
-
-
+import socket
+import ctypes
+import errno
+import logging
+import os
+import queue
+import re
+import selectors
+import sys
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # NumPy é opcional; sem ele, apenas o CSV é gerado
+
+# --- Configurações ---
+UDP_IP = "192.168.137.1"  # O IP do SEU PC (para onde o ESP32 envia dados)
+UDP_PORT_DATA = 4210     # Porta que o Python escuta dados do ESP32
+ESP32_IP = "192.168.137.155" # IP do seu ESP32! (Verifique no Serial Monitor do ESP32)
+ESP32_COMMAND_PORT = 4211 # Porta que o ESP32 está escutando comandos
+
+CSV_FILENAME = "dados_esp32_012.csv"
+ACQUISITION_DURATION_SECONDS = 20 # Duração da aquisição que VOCÊ QUER ENVIAR para o ESP32
+
+# Cópia binária opcional dos dados (requer NumPy). Um .npy é ~4-8x mais
+# compacto que o CSV equivalente e carrega instantaneamente com np.load para
+# as análises posteriores; o CSV continua sendo gravado em streaming, pois
+# sobrevive a uma queda do script no meio da aquisição.
+NPY_FILENAME = os.path.splitext(CSV_FILENAME)[0] + ".npy"
+NPY_DTYPE = [('Tempo_ms', '<u4'), ('Tensao', '<f4'),
+             ('Corrente', '<f4'), ('Rotacao', '<i2')]
+
+# Tamanho pedido para o buffer de recepção do kernel (SO_RCVBUF) do socket de
+# dados. Com o buffer padrão, rajadas de pacotes do ESP32 podem ser descartadas
+# pelo kernel enquanto o Python está entre chamadas de recvfrom. 4 MB é
+# suficiente para absorver vários segundos de dados a taxas altas.
+# OBS: no Linux o valor efetivo é limitado por /proc/sys/net/core/rmem_max;
+# para usar os 4 MB completos, ajuste antes com:
+#     sudo sysctl -w net.core.rmem_max=12582912
+SOCKET_RCVBUF_BYTES = 4 * 1024 * 1024
+
+# Tempo, em MICROSSEGUNDOS, que o kernel gasta fazendo busy-poll da fila da
+# NIC dentro da própria syscall de recepção (SO_BUSY_POLL, Linux), em vez de
+# dormir e esperar a interrupção — reduz a latência de acordar o recvmmsg ao
+# custo de CPU, o que é aceitável em um PC dedicado à aquisição. Requer
+# CAP_NET_ADMIN (ou o sysctl global `net.core.busy_poll=50`); sem permissão,
+# o script segue normalmente sem busy-poll. Use 0 para desativar.
+SOCKET_BUSY_POLL_USECS = 50
+
+# Quantas linhas, no máximo, a thread de gravação coalesce em uma única
+# escrita no arquivo, seguida de um único flush. Gravar e descarregar linha a
+# linha custaria uma travessia Python->C e uma syscall por amostra; por lote,
+# esse custo é amortizado.
+CSV_WRITE_BATCH_MAX_ROWS = 256
+
+# Como os quatro campos são números simples — sem vírgulas, aspas ou nada que
+# exija o escape do módulo csv —, cada linha é formatada direto por este
+# gabarito de bytes (o %-formatting de bytes roda em C), dispensando a
+# máquina de estados do csv.writer. O cabeçalho e as linhas usam sempre
+# b"\n"; o arquivo é aberto em modo binário com buffer grande.
+CSV_HEADER = b"Tempo_ms,Tensao,Corrente,Rotacao\n"
+CSV_ROW_TEMPLATE = b"%d,%.4f,%.4f,%d\n"
+CSV_FILE_BUFFER_BYTES = 1 << 20
+
+# Capacidade máxima da fila entre o laço de recepção e a thread de gravação.
+# Limitada para que um travamento prolongado do disco não consuma memória sem
+# fim; a 100 Hz, 10000 posições equivalem a ~100 s de folga.
+WRITE_QUEUE_MAXSIZE = 10000
+
+# Avisos por evento (pacote fora de ordem, fila cheia, mensagem malformada)
+# saem pelo logging — silenciável pelo usuário — e são limitados a um por
+# intervalo: o stdout é síncrono e, numa tempestade de eventos, imprimir por
+# pacote bloquearia o laço de recepção exatamente quando ele mais precisa
+# voltar ao socket.
+log = logging.getLogger("esp32")
+WARN_INTERVAL_SECONDS = 1.0
+_ultimo_aviso = {}
+
+def rate_limited_warning(chave, msg, *args):
+    """
+    Emite `log.warning(msg, *args)` no máximo uma vez por intervalo, por chave.
+
+    Avisos do caminho quente (pacote fora de ordem, fila cheia, mensagem
+    malformada) podem ocorrer a cada pacote; emitir todos bloquearia o laço
+    de recepção no stdout/handler. Cada `chave` identifica uma categoria de
+    aviso e tem seu próprio portão de `WARN_INTERVAL_SECONDS` segundos — os
+    avisos excedentes dentro do intervalo são simplesmente descartados.
+
+    Args:
+        chave (str): Categoria do aviso (ex.: "fora_de_ordem").
+        msg (str): Mensagem no formato printf do logging.
+        *args: Argumentos da mensagem (formatados só se o aviso for emitido).
+
+    Não retorna nenhum valor.
+    """
+    agora = time.monotonic()
+    anterior = _ultimo_aviso.get(chave)
+    if anterior is None or agora - anterior >= WARN_INTERVAL_SECONDS:
+        _ultimo_aviso[chave] = agora
+        log.warning(msg, *args)
+
+# Tamanho máximo de cada datagrama do ESP32 e quantos datagramas buscamos do
+# kernel por chamada de recvmmsg. Com payloads pequenos, o custo por pacote é
+# dominado pela syscall; buscar até 64 de uma vez amortiza esse custo.
+RECV_BUFFER_BYTES = 1024
+RECVMMSG_BATCH = 64
+
+# Expressão regular COMPILADA (uma vez, na importação) que extrai os quatro
+# campos da mensagem do ESP32 em uma única chamada em C, no lugar do antigo
+# split(',') + split(':') por campo, que criava várias strings temporárias e
+# executava ~12 operações Python por amostra. O padrão é de BYTES: como o
+# formato de fio é ASCII puro, casar direto sobre o payload cru evita o
+# decode UTF-8 e a alocação de uma str por pacote (int() e float() aceitam
+# bytes). O `\s*` tolera os espaços que o firmware envia após as vírgulas, e
+# a vírgula final da mensagem é ignorada por ser casamento de prefixo (match).
+PARSE_RE = re.compile(
+    rb"Tempo_ms:(\d+),\s*Tensao:(-?\d+(?:\.\d+)?),\s*Corrente:(-?\d+(?:\.\d+)?),\s*Rotacao:(-?\d+)"
+)
+
+def _parse_frame_py(data):
+    """
+    Versão Python (regex) de `parse_frame`: extrai os quatro campos de `data`.
+
+    Args:
+        data (bytes): Payload cru do datagrama recebido do ESP32.
+
+    Retorna:
+        tuple | None: `(tempo_ms, tensao, corrente, rotacao)` como
+        `(int, float, float, int)`, ou None se a mensagem não casar com o
+        formato esperado (`PARSE_RE`).
+    """
+    m = PARSE_RE.match(data)
+    if m is None:
+        return None
+    return int(m[1]), float(m[2]), float(m[3]), int(m[4])
+
+# Se o módulo Cython compilado estiver disponível (`cythonize -i
+# parse_frame.pyx`), usa a varredura em C com strtol/strtod — uma ordem de
+# grandeza mais rápida que o caminho interpretado. Caso contrário, a versão
+# com regex acima é usada de forma transparente.
+try:
+    from parse_frame import parse_frame
+except ImportError:
+    parse_frame = _parse_frame_py
+
+# --- Suporte a recvmmsg(2) via ctypes (somente Linux) ---
+# O Python não expõe recvmmsg na stdlib, então chamamos a libc diretamente.
+# Em outras plataformas (ou se a libc não tiver o símbolo), caímos no
+# recvfrom tradicional de um datagrama por syscall.
+_RECVMMSG_DISPONIVEL = sys.platform.startswith("linux")
+if _RECVMMSG_DISPONIVEL:
+    try:
+        _libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        _libc.recvmmsg # Garante que o símbolo existe
+    except (OSError, AttributeError):
+        _RECVMMSG_DISPONIVEL = False
+
+if _RECVMMSG_DISPONIVEL:
+    class _iovec(ctypes.Structure):
+        _fields_ = [("iov_base", ctypes.c_void_p),
+                    ("iov_len", ctypes.c_size_t)]
+
+    class _msghdr(ctypes.Structure):
+        _fields_ = [("msg_name", ctypes.c_void_p),
+                    ("msg_namelen", ctypes.c_uint32),
+                    ("msg_iov", ctypes.POINTER(_iovec)),
+                    ("msg_iovlen", ctypes.c_size_t),
+                    ("msg_control", ctypes.c_void_p),
+                    ("msg_controllen", ctypes.c_size_t),
+                    ("msg_flags", ctypes.c_int)]
+
+    class _mmsghdr(ctypes.Structure):
+        _fields_ = [("msg_hdr", _msghdr),
+                    ("msg_len", ctypes.c_uint)]
+
+    # Buffers e cabeçalhos alocados UMA vez na importação e reutilizados em
+    # toda chamada de receive_datagrams — nada é alocado no caminho quente.
+    _mmsg_buffers = [ctypes.create_string_buffer(RECV_BUFFER_BYTES)
+                     for _ in range(RECVMMSG_BATCH)]
+    _mmsg_iovecs = (_iovec * RECVMMSG_BATCH)()
+    _mmsg_headers = (_mmsghdr * RECVMMSG_BATCH)()
+    for _i in range(RECVMMSG_BATCH):
+        _mmsg_iovecs[_i].iov_base = ctypes.cast(_mmsg_buffers[_i], ctypes.c_void_p)
+        _mmsg_iovecs[_i].iov_len = RECV_BUFFER_BYTES
+        _mmsg_headers[_i].msg_hdr.msg_iov = ctypes.pointer(_mmsg_iovecs[_i])
+        _mmsg_headers[_i].msg_hdr.msg_iovlen = 1
+    del _i
+
+def setup_csv_file():
+    """
+    Abre o arquivo CSV para a gravação dos dados recebidos do ESP32.
+
+    Esta função é responsável por garantir que o arquivo CSV, cujo nome é definido
+    pela variável global `CSV_FILENAME`, esteja pronto para receber os dados.
+
+    Comportamento:
+    1.  Verifica se o arquivo `CSV_FILENAME` já existe no diretório atual.
+    2.  Abre o arquivo **uma única vez**, no modo de anexar BINÁRIO ('ab') com
+        buffer de `CSV_FILE_BUFFER_BYTES`, e o mantém aberto. As linhas são
+        pré-formatadas como bytes pelo gabarito `CSV_ROW_TEMPLATE`, então não
+        há camada de texto/encoding entre a thread de gravação e o arquivo.
+        Abrir/fechar o arquivo a cada pacote custaria um par de syscalls
+        (open/close) por amostra, o que limita a taxa máxima que o script
+        consegue acompanhar.
+    3.  Se o arquivo **não existia**:
+        - A linha de cabeçalho `CSV_HEADER` é escrita na primeira linha.
+          Os cabeçalhos são: 'Tempo_ms', 'Tensao', 'Corrente', 'Rotacao'.
+        - Uma mensagem informativa é impressa no console, indicando que o
+          arquivo foi criado com o cabeçalho.
+    4.  Se o arquivo **já existia**:
+        - Nenhuma alteração é feita no conteúdo existente do arquivo; novas
+          linhas de dados serão simplesmente anexadas ao final.
+        - Uma mensagem informativa é impressa no console, indicando que novas
+          linhas serão adicionadas ao arquivo existente.
+
+    Não recebe argumentos.
+    Retorna:
+        O objeto de arquivo (binário) aberto. Quem chama é responsável por
+        fechá-lo (em `main()`, isso é feito no bloco `finally`).
+    """
+    file_exists = os.path.isfile(CSV_FILENAME)
+    csvfile = open(CSV_FILENAME, 'ab', buffering=CSV_FILE_BUFFER_BYTES)
+    if not file_exists:
+        csvfile.write(CSV_HEADER)
+        print(f"Arquivo '{CSV_FILENAME}' criado com cabeçalho.")
+    else:
+        print(f"Arquivo '{CSV_FILENAME}' já existe. Novas linhas serão adicionadas.")
+    return csvfile
+
+def receive_datagrams(sock):
+    """
+    Drena um lote de datagramas UDP já enfileirados no socket NÃO-bloqueante.
+
+    Deve ser chamada depois que o seletor de `main()` reportou o socket como
+    legível; a espera fica toda a cargo do `selectors.DefaultSelector`, com o
+    timeout calculado a partir do prazo de segurança — esta função nunca
+    bloqueia.
+
+    No Linux, usa `recvmmsg(2)` (via ctypes, já que a stdlib não a expõe) para
+    buscar até `RECVMMSG_BATCH` datagramas do kernel em UMA única syscall.
+    Com pacotes pequenos como os do ESP32, o custo por pacote é dominado pela
+    transição usuário/kernel; buscar 64 de uma vez divide esse custo por 64.
+    A chamada usa `MSG_DONTWAIT` sobre os buffers pré-alocados na importação
+    do módulo e devolve uma lista com o payload (`bytes`) de cada datagrama.
+
+    Em plataformas sem `recvmmsg` (não-Linux ou libc sem o símbolo), drena o
+    socket com chamadas sucessivas de `recvfrom` até `BlockingIOError` (ou até
+    `RECVMMSG_BATCH` datagramas), devolvendo a mesma lista, para que o
+    chamador não precise distinguir os dois caminhos.
+
+    Args:
+        sock (socket.socket): Socket UDP não-bloqueante, já vinculado (bind)
+            à porta de dados.
+
+    Retorna:
+        list[bytes]: Payloads dos datagramas drenados (0 a RECVMMSG_BATCH);
+        vazia se o socket foi esvaziado por outra via entre o seletor e a
+        chamada.
+
+    Levanta:
+        OSError: Se `recvmmsg` falhar por motivo diferente de "sem dados".
+    """
+    if not _RECVMMSG_DISPONIVEL:
+        datagrams = []
+        while len(datagrams) < RECVMMSG_BATCH:
+            try:
+                data, _addr = sock.recvfrom(RECV_BUFFER_BYTES)
+            except BlockingIOError:
+                break
+            datagrams.append(data)
+        return datagrams
+
+    n = _libc.recvmmsg(sock.fileno(), _mmsg_headers, RECVMMSG_BATCH,
+                       socket.MSG_DONTWAIT, None)
+    if n < 0:
+        err = ctypes.get_errno()
+        if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+            # O socket foi esvaziado (ou um sinal chegou) entre o seletor e o
+            # recvmmsg; trata como um ciclo sem dados.
+            return []
+        raise OSError(err, os.strerror(err))
+    return [_mmsg_buffers[i].raw[:_mmsg_headers[i].msg_len] for i in range(n)]
+
+def save_binary_copy(samples):
+    """
+    Grava uma cópia binária (.npy) das amostras acumuladas em memória.
+
+    Chamada por `main()` no encerramento, depois do `join()` da thread de
+    gravação, quando todas as amostras já foram coletadas. Converte a lista de
+    tuplas para um array estruturado NumPy (`NPY_DTYPE`: uint32 para o tempo,
+    float32 para tensão/corrente, int16 para rotação) e salva com `np.save` —
+    uma única escrita em bloco, ~4-8x mais compacta que o texto do CSV e que
+    carrega direto com `np.load` nas análises posteriores.
+
+    Args:
+        samples (list[tuple] | None): Amostras acumuladas pela thread de
+            gravação, ou None se o NumPy não estiver disponível.
+
+    Não retorna nenhum valor. Sem NumPy instalado, ou sem amostras, a função
+    simplesmente não faz nada (o CSV já contém os dados).
+    """
+    if np is None or not samples:
+        return
+    try:
+        np.save(NPY_FILENAME, np.array(samples, dtype=NPY_DTYPE))
+        print(f"Cópia binária com {len(samples)} amostras salva em '{NPY_FILENAME}'.")
+    except Exception as e:
+        print(f"Erro ao salvar a cópia binária '{NPY_FILENAME}': {e}")
+
+def csv_writer_loop(write_q, csvfile, samples=None):
+    """
+    Laço executado pela thread de gravação: drena a fila e escreve no CSV.
+
+    Separar a gravação em disco da recepção UDP evita que um pico de latência
+    do disco (flush, contenção do sistema de arquivos, etc.) atrase o retorno
+    ao `recvfrom` e cause estouro do buffer de recepção do kernel — o padrão
+    clássico de perda de pacotes UDP "enquanto o aplicativo estava ocupado".
+
+    Comportamento:
+    1.  Bloqueia em `write_q.get()` aguardando a próxima linha de dados, que é
+        uma tupla `(timestamp_esp32, tensao, corrente, rotacao)` enfileirada
+        pelo laço de recepção em `main()`.
+    2.  Drena o que mais já estiver na fila com `get_nowait()` (até
+        `CSV_WRITE_BATCH_MAX_ROWS` linhas), formando um lote com a rajada
+        acumulada enquanto a thread estava ocupada ou dormindo.
+    3.  Formata o lote inteiro em um único `bytearray` com o gabarito
+        `CSV_ROW_TEMPLATE` (o %-formatting de bytes roda em C, e os campos
+        numéricos dispensam o escape/aspas do módulo csv) e o escreve com UMA
+        chamada de `write()` e UM flush por lote — em vez de uma travessia
+        Python->C e uma syscall por linha.
+    4.  Encerra quando recebe o valor sentinela `None`, enfileirado por
+        `main()` no bloco `finally` durante o desligamento; o lote parcial em
+        mãos é gravado antes de sair.
+
+    Args:
+        write_q (queue.Queue): Fila limitada de onde as linhas são consumidas.
+        csvfile: Objeto de arquivo CSV (binário) já aberto (ver
+            `setup_csv_file`).
+        samples (list | None): Se fornecida, cada lote gravado também é
+            acumulado nesta lista em memória, para a cópia binária (.npy)
+            salva por `save_binary_copy` no encerramento.
+
+    Não retorna nenhum valor. O fechamento do arquivo continua sendo
+    responsabilidade de `main()`, após o `join()` desta thread.
+    """
+    encerrar = False
+    while not encerrar:
+        row = write_q.get()
+        if row is None: # Sentinela de desligamento
+            break
+        batch = [row]
+        # Coalesce a rajada já enfileirada em um único write/flush.
+        while len(batch) < CSV_WRITE_BATCH_MAX_ROWS:
+            try:
+                row = write_q.get_nowait()
+            except queue.Empty:
+                break
+            if row is None: # Sentinela no meio da rajada: grava e encerra
+                encerrar = True
+                break
+            batch.append(row)
+        buf = bytearray()
+        for linha in batch:
+            buf += CSV_ROW_TEMPLATE % linha
+        csvfile.write(buf)
+        csvfile.flush()
+        if samples is not None:
+            samples.extend(batch)
+
+# Intervalo, em segundos, entre leituras do contador de descartes do kernel
+# para o socket de dados (ver drop_monitor_loop).
+DROP_MONITOR_INTERVAL_SECONDS = 1.0
+
+def _udp_drops(porta):
+    """
+    Lê o contador de descartes do kernel para o socket UDP na porta dada.
+
+    Percorre `/proc/net/udp` (Linux) procurando a linha cujo endereço local
+    termina na porta em hexadecimal e devolve a última coluna ("drops"): o
+    total acumulado de datagramas que o kernel descartou por falta de espaço
+    no buffer de recepção daquele socket.
+
+    Args:
+        porta (int): Porta UDP local (ex.: `UDP_PORT_DATA`).
+
+    Retorna:
+        int | None: Contador acumulado de descartes, ou None se o arquivo não
+        existir (não-Linux), a porta não for encontrada ou a linha não puder
+        ser interpretada.
+    """
+    alvo = f":{porta:04X}"
+    try:
+        with open("/proc/net/udp") as f:
+            next(f) # Pula o cabeçalho
+            for linha in f:
+                campos = linha.split()
+                if campos[1].endswith(alvo):
+                    return int(campos[-1])
+    except (OSError, StopIteration, ValueError, IndexError):
+        pass
+    return None
+
+def drop_monitor_loop(porta, parar):
+    """
+    Laço da thread de monitoramento: vigia descartes de UDP no kernel.
+
+    Mesmo com `SO_RCVBUF` aumentado, uma rajada pode estourar o buffer de
+    recepção SILENCIOSAMENTE — o kernel só incrementa um contador e o script
+    nunca vê os pacotes. Esta thread transforma essa perda invisível em um
+    evento observável: a cada `DROP_MONITOR_INTERVAL_SECONDS` segundos lê o
+    contador de descartes do socket em `/proc/net/udp` e, se ele tiver
+    crescido desde a última leitura, registra um aviso com o delta e a ação
+    recomendada (aumentar `SOCKET_RCVBUF_BYTES`/`net.core.rmem_max` ou
+    reduzir a taxa de amostragem pedida ao ESP32).
+
+    Em plataformas sem `/proc/net/udp`, a thread simplesmente retorna e o
+    monitoramento fica desativado.
+
+    Args:
+        porta (int): Porta UDP local do socket de dados.
+        parar (threading.Event): Evento acionado por `main()` no encerramento
+            para interromper o monitoramento.
+
+    Não retorna nenhum valor.
+    """
+    anterior = _udp_drops(porta)
+    if anterior is None:
+        return # Sem /proc/net/udp (não-Linux): monitoramento desativado
+    while not parar.wait(DROP_MONITOR_INTERVAL_SECONDS):
+        atual = _udp_drops(porta)
+        if atual is None:
+            continue
+        if atual > anterior:
+            log.warning("Kernel descartou %d pacotes UDP no último intervalo "
+                        "(buffer de recepção cheio); considere aumentar "
+                        "SOCKET_RCVBUF_BYTES/net.core.rmem_max ou reduzir a "
+                        "taxa de amostragem.", atual - anterior)
+        anterior = atual
+
+# Socket de comandos criado UMA vez e reutilizado por toda a sessão. Sockets
+# UDP são baratos de manter abertos, e criar/destruir um a cada comando
+# custava duas syscalls extras mais pressão de GC por chamada. O connect()
+# fixa o destino no kernel — a rota e o destino ficam em cache e cada comando
+# vira um simples send(), sem a consulta de rota do sendto avulso; de quebra,
+# destino inalcançável passa a ser reportado como erro no próprio send.
+_sock_command = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) # UDP
+_sock_command_conectado = False
+
+def _connect_command_socket():
+    """
+    Conecta (uma única vez) o socket de comandos ao endereço do ESP32.
+
+    Chamada de forma preguiçosa por `send_command_to_esp32`: se a rede ainda
+    estiver fora do ar (ex.: hotspot não conectado) no primeiro comando, a
+    falha é reportada pelo try/except de quem chama e a conexão é tentada de
+    novo no comando seguinte — sem derrubar a importação do módulo nem
+    inutilizar o socket para sempre.
+
+    Não recebe argumentos e não retorna nenhum valor.
+
+    Levanta:
+        OSError: Se o kernel não conseguir fixar a rota para o destino.
+    """
+    global _sock_command_conectado
+    if not _sock_command_conectado:
+        _sock_command.connect((ESP32_IP, ESP32_COMMAND_PORT))
+        _sock_command_conectado = True
+
+def send_command_to_esp32(command):
+    """
+    Envia um comando via protocolo UDP (User Datagram Protocol) para o módulo ESP32.
+
+    Esta função estabelece uma comunicação unidirecional para enviar instruções
+    ao ESP32, reutilizando o socket UDP de comandos (`_sock_command`), criado
+    uma única vez na importação do módulo e conectado (`connect`) ao endereço
+    do ESP32 no primeiro comando — o kernel mantém rota e destino em cache, e
+    cada comando vira um simples `send()`.
+
+    Processo:
+    1.  Tenta enviar a string do comando (`command`) pelo socket conectado ao
+        endereço definido pelas variáveis globais `ESP32_IP` e
+        `ESP32_COMMAND_PORT`. A string do comando é codificada para bytes
+        usando UTF-8 antes do envio.
+    2.  Em caso de sucesso, uma mensagem é impressa no console confirmando o envio
+        do comando e o destino.
+    3.  Em caso de falha durante o envio (por exemplo, problemas de rede, ESP32
+        não acessível), uma exceção é capturada e uma mensagem de erro é impressa.
+
+    O socket de comandos permanece aberto entre as chamadas; ele é fechado uma
+    única vez, no bloco `finally` de `main()`, junto com o socket de dados.
+
+    Args:
+        command (str): A string do comando a ser enviada. Exemplos de comandos
+                       esperados pelo ESP32 podem ser:
+                       - "START_ACQUISITION:20000" (inicia aquisição por 20 segundos)
+                       - "STOP_ACQUISITION" (interrompe a aquisição)
+
+    Não retorna nenhum valor.
+    """
+    try:
+        _connect_command_socket()
+        _sock_command.send(command.encode('utf-8'))
+        print(f"Comando '{command}' enviado para ESP32 em {ESP32_IP}:{ESP32_COMMAND_PORT}")
+    except Exception as e:
+        print(f"Erro ao enviar comando para o ESP32: {e}")
+
+def main():
+    """
+    Função principal do script, responsável por gerenciar a comunicação UDP
+    com o ESP32 e a gravação dos dados em um arquivo CSV.
+    
+    Esta função coordena todo o fluxo de trabalho do programa:
+    
+    1.  **Validação Inicial do IP do ESP32**:
+        - Verifica se a variável global `ESP32_IP` ainda contém o endereço IP
+          fictício de exemplo. Se sim, imprime um aviso crítico no console,
+          lembrando o usuário de configurar o IP real do seu ESP32.
+          (Uma linha `return` comentada existe para, se descomentada, forçar
+          a interrupção do script até que o IP seja corrigido).
+    
+    2.  **Configuração do Socket de Dados para Recepção**:
+        - Cria um socket UDP (`sock_data`) que será usado para receber os dados
+          enviados pelo ESP32.
+        - Vincula este socket ao endereço IP do PC (`UDP_IP`) e à porta de dados
+          (`UDP_PORT_DATA`), tornando o script "escuta" por pacotes UDP nestes
+          parâmetros.
+        - Coloca o socket em modo não-bloqueante e o registra em um
+          `selectors.DefaultSelector`; a espera por dados acontece no seletor,
+          com timeout calculado a partir do prazo de segurança, evitando que o
+          script fique bloqueado indefinidamente esperando por dados.
+        - Inicia a thread `drop_monitor_loop`, que vigia o contador de
+          descartes do kernel para este socket em `/proc/net/udp` e avisa
+          quando pacotes são perdidos por estouro do buffer de recepção.
+    
+    3.  **Preparação do Arquivo CSV e da Thread de Gravação**:
+        - Chama a função `setup_csv_file()` para abrir o arquivo CSV uma única
+          vez (criado com cabeçalho ou pronto para anexar).
+        - Cria a fila limitada `write_q` e inicia a thread `csv_writer_loop`,
+          que consome a fila e grava as linhas no CSV em segundo plano.
+    
+    4.  **Envio do Comando de Início de Aquisição**:
+        - Converte a `ACQUISITION_DURATION_SECONDS` (em segundos) para milissegundos.
+        - Constrói a string do comando de início no formato
+          "START_ACQUISITION:<duração_em_ms>".
+        - Envia este comando ao ESP32 usando a função `send_command_to_esp32()`.
+          O ESP32 é esperado para iniciar a coleta e transmissão de dados por
+          essa duração.
+    
+    5.  **Loop Principal de Recepção e Processamento de Dados**:
+        - Entra em um loop `while True` que continua indefinidamente até ser
+          interrompido por um timeout de segurança, erro, ou interrupção do usuário.
+        - **Timeout de Segurança do Python**:
+            - O prazo (duração da aquisição esperada do ESP32 mais uma margem
+              de 5 segundos) é calculado uma única vez com `time.monotonic()`,
+              o relógio correto para prazos por ser imune a ajustes do relógio
+              de parede; a cada iteração resta apenas uma subtração e uma
+              comparação de floats. Se o prazo venceu, assume que o ESP32
+              parou de enviar dados inesperadamente e encerra o loop.
+            - O tempo restante limita também o timeout da espera por dados,
+              de modo que o corte de segurança dispara pontualmente, como um
+              timer, e não até 1 segundo depois do prazo.
+        - **Recepção de Dados**:
+            - Recebe um LOTE de pacotes UDP com `receive_datagrams()`, que no
+              Linux usa `recvmmsg(2)` para buscar até `RECVMMSG_BATCH`
+              datagramas por syscall (com fallback para `recvfrom` em outras
+              plataformas).
+            - Cada payload é processado como `bytes` cru; não há decodificação
+              UTF-8 no caminho quente (só nos avisos de erro, já fora dele).
+        - **Processamento da Mensagem**:
+            - A mensagem recebida é esperada no formato:
+              "Tempo_ms:VALOR,Tensao:VALOR,Corrente:VALOR,Rotacao:VALOR".
+            - `parse_frame` extrai de uma só vez os valores de `Tempo_ms`
+              (int), `Tensao` (float), `Corrente` (float) e `Rotacao` (int) —
+              pela extensão Cython compilada, quando construída, ou pela
+              regex compilada `PARSE_RE`; se devolver None, a mensagem é
+              tratada como malformada.
+        - **Validação do Timestamp (pré-checagem)**:
+            - Antes do parse completo, extrai apenas o `Tempo_ms` do início do
+              payload (uma busca de vírgula e um `int()`) e o compara com
+              `last_received_timestamp_esp32`.
+            - Se o timestamp não for estritamente maior que o anterior (e não
+              for o primeiro pacote), o pacote é DESCARTADO como duplicado ou
+              fora de ordem — situação que o UDP produz por definição — com um
+              aviso via logging limitado a um por segundo
+              (`rate_limited_warning`), economizando ~75% do custo de parse
+              nesses eventos.
+            - Caso contrário, após o parse completo,
+              `last_received_timestamp_esp32` é atualizado com o timestamp.
+        - **Gravação no CSV**:
+            - Se a mensagem foi processada corretamente, a tupla de valores é
+              enfileirada (`put_nowait`) na fila limitada `write_q`; a thread
+              de gravação (`csv_writer_loop`) consome a fila e escreve no CSV,
+              desacoplando a latência do disco do laço de recepção.
+            - Se a fila estiver cheia (disco muito atrás da rede), a amostra é
+              descartada com um aviso limitado por taxa, em vez de bloquear a
+              recepção.
+        - **Tratamento de Erros no Loop**:
+            - Ciclos do seletor sem dados apenas voltam a checar o prazo de
+              segurança, sem imprimir nada (escrever no console a cada segundo
+              ocioso tem custo e polui a saída em aquisições reais).
+            - `except Exception as e`: Captura quaisquer outros erros que possam
+              ocorrer durante o processamento de uma mensagem (ex: formato
+              inesperado). Imprime o erro e a mensagem bruta.
+    
+    6.  **Gerenciamento de Encerramento (try...except...finally)**:
+        - `except KeyboardInterrupt`: Captura a interrupção do usuário (Ctrl+C),
+          imprimindo uma mensagem de encerramento.
+        - `except Exception as e`: Captura quaisquer erros gerais não tratados
+          anteriormente que possam ocorrer fora do loop principal.
+        - `finally`: Este bloco é **sempre** executado, garantindo uma finalização
+          limpa do script:
+            - Enfileira o sentinela `None` e faz `join()` na thread de
+              gravação, para que toda amostra já recebida chegue ao CSV.
+            - Salva a cópia binária `.npy` das amostras acumuladas em memória
+              (`save_binary_copy`), se o NumPy estiver disponível.
+            - Envia um comando "STOP_ACQUISITION" para o ESP32, instruindo-o
+              a parar de transmitir dados.
+            - Fecha o socket de dados (`sock_data.close()`) e o socket de
+              comandos reutilizado (`_sock_command.close()`), liberando as
+              portas e os recursos de rede.
+            - Fecha o arquivo CSV, descarregando para o disco as linhas que
+              ainda estavam no buffer.
+            - Imprime uma mensagem confirmando o fechamento do socket.
+    
+    Não recebe argumentos.
+    Não retorna nenhum valor.
+    """
+    # Validação do IP do ESP32
+    # if ESP32_IP == "192.168.137.155": # Este é o IP fictício do exemplo
+    #     print("\nATENÇÃO: Por favor, substitua 'ESP32_IP' no código pelo IP real do seu ESP32 antes de rodar!")
+    #     # return # Descomente essa linha para forçar você a mudar o IP
+
+    # Socket para receber dados do ESP32
+    sock_data = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # SO_REUSEADDR permite religar a porta imediatamente após um encerramento
+    # abrupto do script, sem esperar o kernel liberar o endereço.
+    sock_data.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock_data.bind((UDP_IP, UDP_PORT_DATA))
+
+    # Busy-poll da NIC dentro da syscall de recepção (somente Linux): corta a
+    # latência da interrupção ao custo de CPU. Opcional — exige privilégio
+    # (CAP_NET_ADMIN); sem ele, apenas seguimos sem busy-poll. Em máquinas
+    # com várias filas de rede, fixar também SO_INCOMING_CPU na CPU que roda
+    # este processo evita pingue-pongue de cache entre núcleos.
+    if SOCKET_BUSY_POLL_USECS > 0 and hasattr(socket, "SO_BUSY_POLL"):
+        try:
+            sock_data.setsockopt(socket.SOL_SOCKET, socket.SO_BUSY_POLL,
+                                 SOCKET_BUSY_POLL_USECS)
+        except OSError as e:
+            print(f"Aviso: sem permissão para SO_BUSY_POLL ({e}); seguindo sem busy-poll.")
+
+    # Aumenta o buffer de recepção do kernel para absorver rajadas do ESP32
+    # sem perda de pacotes (o padrão costuma ser de apenas ~200 KB).
+    sock_data.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF_BYTES)
+    # Lê de volta o valor efetivo: o Linux dobra o valor pedido e limita em
+    # net.core.rmem_max, então o que vale é o que o kernel reporta aqui.
+    rcvbuf_efetivo = sock_data.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    print(f"Buffer de recepção (SO_RCVBUF): pedido {SOCKET_RCVBUF_BYTES} bytes, efetivo {rcvbuf_efetivo} bytes")
+
+    # Socket não-bloqueante: a espera por dados fica a cargo do seletor no
+    # laço de main(), com timeout calculado a partir do prazo de segurança.
+    sock_data.setblocking(False)
+    sel = selectors.DefaultSelector()
+    sel.register(sock_data, selectors.EVENT_READ)
+
+    # Monitor de estouro do buffer de recepção: sem ele, pacotes descartados
+    # pelo kernel por falta de espaço somem em silêncio; a thread vigia o
+    # contador em /proc/net/udp e avisa quando há perda.
+    monitor_stop = threading.Event()
+    monitor_thread = threading.Thread(target=drop_monitor_loop,
+                                      args=(UDP_PORT_DATA, monitor_stop),
+                                      daemon=True)
+    monitor_thread.start()
+
+    print(f"Escutando dados UDP em {UDP_IP}:{UDP_PORT_DATA}")
+
+    # Arquivo CSV aberto UMA vez; a gravação fica a cargo de uma thread
+    # dedicada, de modo que o caminho quente só faz put_nowait na fila e volta
+    # imediatamente ao recvfrom.
+    csvfile = setup_csv_file()
+    write_q = queue.Queue(maxsize=WRITE_QUEUE_MAXSIZE)
+    # Com NumPy disponível, as amostras também são acumuladas em memória para
+    # a cópia binária (.npy) salva no encerramento.
+    samples = [] if np is not None else None
+    writer_thread = threading.Thread(target=csv_writer_loop,
+                                     args=(write_q, csvfile, samples),
+                                     daemon=True)
+    writer_thread.start()
+
+    # --- Enviar o comando de INÍCIO de aquisição com a duração ---
+    duration_ms = ACQUISITION_DURATION_SECONDS * 1000 # Converte segundos para milissegundos
+    start_command = f"START_ACQUISITION:{duration_ms}"
+    send_command_to_esp32(start_command)
+
+    # O script Python agora apenas espera os dados, o ESP32 controla a duração
+    print(f"Aguardando dados do ESP32 por até {ACQUISITION_DURATION_SECONDS} segundos (controlado pelo ESP32)...")
+    
+    # Prazo de segurança do lado do Python, calculado UMA vez com o relógio
+    # monotônico — imune a ajustes do relógio de parede (NTP, horário de
+    # verão) e o relógio correto para prazos; a checagem no laço vira uma
+    # simples comparação de floats.
+    deadline = time.monotonic() + ACQUISITION_DURATION_SECONDS + 5 # +5s de margem
+
+    last_received_timestamp_esp32 = -1 # Para verificar a progressão do tempo do ESP32
+
+    # Liga os chamáveis do caminho quente a nomes locais UMA vez: dentro do
+    # laço, LOAD_FAST substitui o LOAD_GLOBAL/LOAD_ATTR que o CPython faria a
+    # cada pacote para resolver módulo.atributo — micro-otimização clássica
+    # que, num laço por pacote, rende alguns % a custo zero.
+    _monotonic = time.monotonic
+    _select = sel.select
+    _receive = receive_datagrams
+    _parse = parse_frame
+    _put_nowait = write_q.put_nowait
+
+    try:
+        while True:
+            # Timeout de segurança do lado do Python, caso o ESP32 pare de enviar inesperadamente.
+            # O tempo restante até o prazo também vira o timeout da espera por
+            # dados, de modo que o corte dispara na hora certa (como um timer),
+            # em vez de até 1 s atrasado.
+            remaining = deadline - _monotonic()
+            if remaining <= 0:
+                print("\nAVISO: Tempo limite de espera do Python excedido. O ESP32 pode ter parado de enviar dados.")
+                break
+
+            # Espera o socket ficar legível (ou o prazo vencer). Ciclo sem
+            # dados apenas volta a checar o prazo — sem imprimir nada, pois
+            # escrever no stdout a cada segundo ocioso tem custo e polui o
+            # console durante aquisições reais.
+            if not _select(timeout=min(remaining, 1.0)):
+                continue
+
+            data = None # Último payload visto, para o aviso de erro abaixo
+            try:
+                # Drena um LOTE de datagramas (até RECVMMSG_BATCH por syscall
+                # no Linux; recvfrom até esvaziar no fallback).
+                for data in _receive(sock_data):
+                    # Pré-checagem barata de duplicados/fora de ordem (que o
+                    # UDP produz por definição): Tempo_ms é sempre o primeiro
+                    # campo, então extraímos só ele — uma busca de vírgula e
+                    # um int() — e descartamos o pacote velho ANTES de pagar o
+                    # parse completo dos quatro campos.
+                    if last_received_timestamp_esp32 != -1 and data.startswith(b"Tempo_ms:"):
+                        virgula = data.find(b",", 9)
+                        if virgula > 9:
+                            try:
+                                ts_head = int(data[9:virgula])
+                            except ValueError:
+                                ts_head = -1 # Cabeçalho ilegível: deixa o parse completo decidir
+                            if ts_head > -1 and ts_head <= last_received_timestamp_esp32:
+                                rate_limited_warning("fora_de_ordem",
+                                                     "Pacote fora de ordem ou duplicado descartado: Tempo_ms=%d (anterior=%d)",
+                                                     ts_head, last_received_timestamp_esp32)
+                                continue
+
+                    # Processar a mensagem: parse_frame extrai os quatro
+                    # campos de uma vez direto sobre os bytes crus (módulo
+                    # Cython compilado, se construído; senão, regex em C da
+                    # stdlib) — sem decode UTF-8 no caminho quente.
+                    parsed = _parse(data)
+                    if parsed is not None:
+                        timestamp_esp32, tensao, corrente, rotacao = parsed
+                        last_received_timestamp_esp32 = timestamp_esp32
+
+                        try:
+                            _put_nowait((timestamp_esp32, tensao, corrente, rotacao))
+                        except queue.Full:
+                            rate_limited_warning("fila_cheia",
+                                                 "Fila de gravação cheia; amostra descartada (disco lento?)")
+                        # print(f"Salvo: Tempo_ms={timestamp_esp32}, Tensao={tensao:.2f}, Corrente={corrente:.2f}, Rotacao={rotacao}")
+                    else:
+                        rate_limited_warning("malformada",
+                                             "Mensagem incompleta/malformada: %r", data)
+
+            except Exception as e:
+                rate_limited_warning("erro_processamento",
+                                     "Erro ao processar dados recebidos: %s (payload: %r)",
+                                     e, data)
+
+    except KeyboardInterrupt:
+        print("\nPrograma encerrado pelo usuário.")
+    except Exception as e:
+        print(f"Ocorreu um erro geral: {e}")
+    finally:
+        # Encerra o monitor de descartes e sinaliza o fim para a thread de
+        # gravação, esperando ela drenar a fila para que nenhuma amostra
+        # enfileirada seja perdida.
+        monitor_stop.set()
+        write_q.put(None)
+        writer_thread.join()
+        save_binary_copy(samples) # Cópia .npy opcional (se NumPy disponível)
+        send_command_to_esp32("STOP_ACQUISITION") # Envia o comando STOP ao finalizar o script Python
+        sel.close() # Libera o descritor do seletor (epoll/kqueue)
+        sock_data.close()
+        _sock_command.close() # Socket de comandos reutilizado; fechado uma única vez aqui
+        csvfile.close() # Garante que as linhas ainda no buffer cheguem ao disco
+        print("Socket de dados fechado.")
+
+if __name__ == "__main__":
+    # Avisos do caminho quente saem pelo logging; suba para ERROR para
+    # silenciá-los ou desça para DEBUG ao depurar a comunicação.
+    logging.basicConfig(level=logging.WARNING,
+                        format="%(levelname)s %(name)s: %(message)s")
+    main()
+    # Este é um padrão comum em scripts Python. 
+    # Garante que a função main() seja chamada apenas quando
+    # o script é executado diretamente (e não quando é importado 
+    # como um módulo em outro script)
+
+
+
+
+
+
+
+
+
+